@@ -9,23 +9,59 @@ Streamlit KPI Dashboard — Presentation-ready (Line charts + Leaderboards)
 """
 
 import re
+import hashlib
 from datetime import datetime
+from io import BytesIO
+from pathlib import Path
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 
+try:
+    import python_calamine  # noqa: F401  (Rust-backed reader, much faster than openpyxl)
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default (openpyxl)
+
+# cleaned sheets are kept here as Parquet so restarts skip the Excel parse and cleaning;
+# bump CLEAN_VERSION whenever clean_and_prepare's output changes
+CACHE_DIR = Path(__file__).resolve().parent / ".cache"
+CLEAN_VERSION = 3
+# most recently used sidecars kept on disk, matching the in-memory max_entries
+CACHE_KEEP = 4
+
+# regex patterns, compiled once at import
+_YYYYMMDD = re.compile(r"^\d{8}$")
+_FLOAT_SUFFIX = re.compile(r"\.0$")
+_SLASH_DMY = re.compile(r"^\d{1,2}/\d{1,2}/\d{4}$")
+_DURATION_SPLIT = re.compile(r"\s*[-–—]\s*|\s+to\s+")
+
 # ---------- Page config ----------
 st.set_page_config(page_title="KPI Dashboard — Line Charts", layout="wide")
 st.title("📊 KPI Dashboard — Line Charts")
 
 # ---------- Helpers ----------
-@st.cache_data
-def load_excel_anysheet(path_or_buffer):
+def _arrow_safe(df):
+    """
+    Hand-edited sheets mix numbers and text (e.g. ' ') in one column, which
+    Parquet can't store. Keep such cells as text — the numeric/date parsing
+    in clean_and_prepare reads them back the same way.
+    """
+    for c in df.columns[df.dtypes == object]:
+        # infer_dtype scans in C rather than calling type() per cell; int/float
+        # mixes ('mixed-integer-float') are stored fine as doubles and stay numeric
+        if pd.api.types.infer_dtype(df[c], skipna=True) in ('mixed', 'mixed-integer'):
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return df
+
+def load_excel_anysheet(raw_bytes):
     """
     Load first sensible sheet: prefer '5','1','Sheet1' otherwise first sheet.
     """
+    path_or_buffer = BytesIO(raw_bytes)
     try:
-        xls = pd.ExcelFile(path_or_buffer)
+        xls = pd.ExcelFile(path_or_buffer, engine=EXCEL_ENGINE)
         preferred = None
         for s in ['5', '1', 'Sheet1', 'Sheet 1']:
             if s in xls.sheet_names:
@@ -34,64 +70,73 @@ def load_excel_anysheet(path_or_buffer):
         sheet = preferred if preferred is not None else xls.sheet_names[0]
         df = pd.read_excel(xls, sheet_name=sheet)
     except Exception:
-        df = pd.read_excel(path_or_buffer)
-    return df
+        path_or_buffer.seek(0)
+        df = pd.read_excel(path_or_buffer, engine=EXCEL_ENGINE)
+    return _arrow_safe(df)
 
-def parse_numeric_yyyymmdd(x):
-    if pd.isna(x):
-        return pd.NaT
-    s = str(x).strip()
-    # numeric 8-digit YYYYMMDD
-    m = re.match(r"^(\d{8})(?:\.0)?$", s)
-    if m:
-        try:
-            return pd.to_datetime(m.group(1), format="%Y%m%d")
-        except Exception:
-            pass
-    # try several formats and pandas fallback
-    fmts = ["%Y%m%d","%Y-%m-%d","%Y/%m/%d","%Y.%m.%d","%d/%m/%Y","%m/%d/%Y"]
-    for f in fmts:
-        try:
-            return pd.to_datetime(s, format=f)
-        except Exception:
-            continue
-    return pd.to_datetime(s, errors='coerce')
-
-def parse_work_duration_column(df, col="Work Duration"):
-    starts, ends = [], []
-    for v in df.get(col, pd.Series([pd.NA]*len(df))):
-        if pd.isna(v):
-            starts.append(pd.NaT); ends.append(pd.NaT); continue
-        s = str(v).strip()
-        # split by hyphen or 'to'
-        parts = re.split(r"\s*[-–—]\s*|\s+to\s+", s)
-        if len(parts) >= 2:
-            st = parse_numeric_yyyymmdd(parts[0])
-            en = parse_numeric_yyyymmdd(parts[1])
-        else:
-            st = parse_numeric_yyyymmdd(parts[0])
-            en = pd.NaT
-        starts.append(st); ends.append(en)
-    df = df.copy()
-    df['start_date'] = pd.to_datetime(starts, errors='coerce')
-    df['end_date'] = pd.to_datetime(ends, errors='coerce')
-    return df
+def parse_date_series(s):
+    """
+    Parse a whole column of dates in vectorized calls. 8-digit YYYYMMDD
+    values (the usual KPI sheet format) take the fixed-format C parser; the
+    rest go through format='mixed'. Only dd/mm/yyyy slash dates are read
+    day-first; dash and dot forms stay month-first, as they always were.
+    cache=True parses each distinct string only once.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s  # real excel date cells: nothing to parse
+    s = s.astype('string').str.strip()
+    # excel hands numeric cells back as floats (e.g. 20250623.0)
+    s = s.str.replace(_FLOAT_SUFFIX, "", regex=True)
+    out = pd.Series(pd.NaT, index=s.index, dtype='datetime64[ns]')
+    mask8 = s.str.match(_YYYYMMDD, na=False).to_numpy(dtype=bool)
+    if mask8.any():
+        out[mask8] = pd.to_datetime(s[mask8], format="%Y%m%d", errors='coerce', cache=True)
+    slash = s.str.match(_SLASH_DMY, na=False).to_numpy(dtype=bool)
+    for mask, dayfirst in ((slash, True), (~mask8 & ~slash & s.notna().to_numpy(), False)):
+        if mask.any():
+            out[mask] = pd.to_datetime(s[mask], format='mixed', dayfirst=dayfirst, errors='coerce', cache=True)
+    return out
+
+def split_work_duration(s):
+    """
+    Split Work Duration text ('20250623-20250704', 'A to B', or a single date)
+    into unparsed start/end strings; single dates leave the end missing.
+    """
+    s = s.astype('string').str.strip()
+    # split by hyphen or 'to'
+    parts = s.str.split(_DURATION_SPLIT, n=1, expand=True, regex=True)
+    parts = parts.reindex(columns=[0, 1])
+    return parts[0], parts[1]
+
+def _to_fraction(s):
+    # values that look like percent points (e.g. 92 rather than 0.92) are scaled down;
+    # one float32 multiply either way instead of a conditional divide
+    m = s.max()
+    scale = np.float32(0.01) if pd.notna(m) and m > 1.5 else np.float32(1.0)
+    return s.to_numpy(dtype='float32', na_value=np.nan) * scale
 
 def clean_and_prepare(df):
-    df = df.copy()
+    # mutates in place — pass a copy if you need to preserve the original
     # normalize column names
     df.columns = [c.strip() for c in df.columns]
 
-    # parse date columns
-    if 'Date Completed' in df.columns:
-        df['Date Completed'] = df['Date Completed'].apply(parse_numeric_yyyymmdd)
-
+    # parse all date columns in a single pass: Date Completed and both Work Duration
+    # halves are stacked into one series, so the parser (and its cache) runs once
+    date_parts = {}
+    if 'Date Completed' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['Date Completed']):
+        date_parts['Date Completed'] = df['Date Completed']
     if 'Work Duration' in df.columns:
-        df = parse_work_duration_column(df, 'Work Duration')
+        date_parts['start_date'], date_parts['end_date'] = split_work_duration(df['Work Duration'])
+    if date_parts:
+        parsed = parse_date_series(pd.concat(date_parts))
+        for c in date_parts:
+            df[c] = parsed.loc[c].to_numpy()
 
     # if end_date missing, use Date Completed if available
     if 'end_date' in df.columns and 'Date Completed' in df.columns:
-        df['end_date'] = df['end_date'].fillna(df['Date Completed'])
+        end = df['end_date'].to_numpy('datetime64[ns]')
+        done = df['Date Completed'].to_numpy('datetime64[ns]')
+        df['end_date'] = np.where(np.isnat(end), done, end)
 
     # decide month timestamp column (for full timeline grouping)
     fallback = None
@@ -105,66 +150,216 @@ def clean_and_prepare(df):
         fallback = pd.NaT
 
     df['month_dt'] = pd.to_datetime(fallback, errors='coerce')
-    df['month'] = df['month_dt'].dt.to_period('M').dt.to_timestamp()
+    # truncate to month start with a numpy unit cast instead of a Period round-trip
+    df['month'] = df['month_dt'].to_numpy('datetime64[ns]').astype('datetime64[M]').astype('datetime64[ns]')
 
-    # numeric conversion for relevant columns
-    for c in ['Target Work Hours','Actual Work Hours','Efficiency','QS%','Revision/s']:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors='coerce')
+    # numeric conversion for relevant columns (columns excel already typed as numbers are left alone)
+    num_cols = [c for c in ['Target Work Hours','Actual Work Hours','Efficiency','QS%','Revision/s']
+                if c in df.columns and not pd.api.types.is_numeric_dtype(df[c])]
+    if num_cols:
+        df[num_cols] = df[num_cols].apply(pd.to_numeric, errors='coerce')
 
-    # compute OnTime (1 if Date Completed <= end_date)
+    # compute OnTime (1 if Date Completed <= end_date, NaN while either date is unknown);
+    # plain float32 so the groupby mean takes numpy's fast path
     if 'Date Completed' in df.columns and 'end_date' in df.columns:
-        df['OnTime'] = (df['Date Completed'] <= df['end_date']).astype('Int64')
+        valid = df['Date Completed'].notna() & df['end_date'].notna()
+        ontime = np.where(valid, (df['Date Completed'] <= df['end_date']).to_numpy(), np.nan)
+        df['OnTime'] = ontime.astype('float32')
     else:
-        df['OnTime'] = pd.NA
+        df['OnTime'] = np.float32(np.nan)
 
     # normalize percent-like columns to fractions (0..1)
     if 'QS%' in df.columns:
-        df['QS_frac'] = df['QS%'].copy()
-        if df['QS_frac'].max(skipna=True) is not None and df['QS_frac'].max(skipna=True) > 1.5:
-            df['QS_frac'] = df['QS_frac'] / 100.0
+        df['QS_frac'] = _to_fraction(df['QS%'])
 
     if 'Revision/s' in df.columns:
-        df['Rev_frac'] = df['Revision/s'].copy()
-        # if values look like percent points (e.g., 20) convert to fraction
-        if df['Rev_frac'].max(skipna=True) is not None and df['Rev_frac'].max(skipna=True) > 1.5:
-            df['Rev_frac'] = df['Rev_frac'] / 100.0
+        df['Rev_frac'] = _to_fraction(df['Revision/s'])
 
-    if 'Efficiency' in df.columns:
-        df['Eff_frac'] = df['Efficiency'].copy()
-        if df['Eff_frac'].max(skipna=True) is not None and df['Eff_frac'].max(skipna=True) > 1.5:
-            df['Eff_frac'] = df['Eff_frac'] / 100.0
-
-    # Actual Work Hours safe numeric
+    # Actual Work Hours: missing counts as zero (already numeric from above)
     if 'Actual Work Hours' in df.columns:
-        df['Actual Work Hours'] = pd.to_numeric(df['Actual Work Hours'], errors='coerce').fillna(0)
+        df['Actual Work Hours'] = df['Actual Work Hours'].fillna(0)
 
-    # task id for counting
-    if 'Ref. number' in df.columns:
-        df['_task_id'] = df['Ref. number']
-    else:
-        df['_task_id'] = range(len(df))
+    # efficiency = target / actual hours (NaN where no hours were logged); the sheet's
+    # own Efficiency column is only used when the hour columns are missing
     if "Target Work Hours" in df.columns and "Actual Work Hours" in df.columns:
-        df["Eff_frac"] = df["Target Work Hours"] / df["Actual Work Hours"]
+        target = df["Target Work Hours"].to_numpy(dtype='float64', na_value=np.nan)
+        actual = df["Actual Work Hours"].to_numpy(dtype='float64', na_value=np.nan)
+        df["Eff_frac"] = np.where(actual > 0, target / np.where(actual > 0, actual, 1), np.nan)
+    elif 'Efficiency' in df.columns:
+        df['Eff_frac'] = _to_fraction(df['Efficiency'])
     else:
-        df["Eff_frac"] = pd.NA
+        df["Eff_frac"] = np.nan
+
+    # derived KPI fractions carry a few significant digits at most: float32 halves the bytes the
+    # groupbys read. The raw hour columns keep their sheet dtype, since the inspector, the CSV
+    # export and the Manhours sums show them as entered
+    for c in ('QS_frac', 'Rev_frac', 'Eff_frac', 'OnTime'):
+        if c in df.columns:
+            df[c] = df[c].astype('float32', copy=False)
+
+    # low-cardinality text columns as categories: cheaper groupby / isin
+    if 'Status' in df.columns:
+        df['_is_completed'] = df['Status'].astype('string').str.lower().eq('completed').fillna(False).to_numpy(dtype=bool)
+    for c in ('Name', 'Project Involvement', 'Status'):
+        if c in df.columns:
+            df[c] = df[c].astype('category')
 
+    return df
 
+def _prune_sidecars():
+    """
+    Bound the on-disk cache: drop sidecars written by other CLEAN_VERSIONs and
+    keep only the CACHE_KEEP most recently used ones.
+    """
+    current = []
+    for p in CACHE_DIR.glob("*.parquet"):
+        if p.name.endswith(f".v{CLEAN_VERSION}.parquet"):
+            current.append((p.stat().st_mtime, p))
+        else:
+            p.unlink(missing_ok=True)
+    current.sort(reverse=True)
+    for _, p in current[CACHE_KEEP:]:
+        p.unlink(missing_ok=True)
+
+def _workbook_key(raw_bytes):
+    # content hash of the workbook: names the sidecar and keys the monthly aggregates
+    return hashlib.blake2b(raw_bytes, digest_size=8).hexdigest()
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def clean_and_prepare_cached(data_key, _raw_bytes):
+    """
+    Load + clean in one cached step, keyed on the workbook's content hash
+    (see _workbook_key) alone, so widget reruns skip parsing entirely and the
+    same bytes uploaded under another name reuse the entry. Filtering stays
+    outside the cache.
+    Held as a shared resource (no per-rerun copy): callers must treat the
+    returned frame as read-only.
+    The cleaned frame is also kept as a Parquet sidecar in .cache/ keyed on
+    the file hash, so later runs (even after a restart) skip both the Excel
+    parse and the cleaning. Old sidecars are pruned on write (see CACHE_KEEP).
+    """
+    cache_path = CACHE_DIR / f"{data_key}.v{CLEAN_VERSION}.parquet"
+    if cache_path.exists():
+        try:
+            df = pd.read_parquet(cache_path)
+            cache_path.touch()  # mark as recently used for pruning
+            return df
+        except Exception:
+            pass  # unreadable sidecar — re-parse and overwrite it
+
+    raw = load_excel_anysheet(_raw_bytes)
+    if raw is None or raw.empty:
+        return raw
+    df = clean_and_prepare(raw)
+
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        df.to_parquet(cache_path, compression='zstd')
+        _prune_sidecars()
+    except Exception:
+        pass  # read-only deploy or no pyarrow — the sidecar is only an optimization
     return df
 
-def plot_line_generic(df_plot, x_col, y_col, title, color_col=None, is_pct=False):
+# KPI line charts: (column, panel title, is_pct)
+KPI_CHARTS = [
+    ('QS_mean', "Average Quality Score", True),
+    ('Rev_mean', "Average Revision Rate", True),
+    ('Tasks', "Total Completed Tasks", False),
+    ('OnTime_pct', "On-time Delivery", True),
+    ('Eff_mean', "Actual Work Efficiency", True),
+    ('Manhours', "Man-hours Spent", False),
+]
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def build_kpi_figure(df_plot, x_col, metrics, title, color_col=None):
+    """
+    All KPIs as one faceted line chart (one panel per metric) rather than a
+    figure each — a single Plotly payload and browser render per section.
+    Cached on the plotted frame, so reruns that don't change it reuse the
+    figure; the returned figure is shared and must not be modified.
+    """
+    labels = {col: label for col, label, _ in metrics}
+    long = df_plot.melt(id_vars=[x_col] + ([color_col] if color_col else []),
+                        value_vars=list(labels), var_name='metric', value_name='value')
+    long['metric'] = long['metric'].map(labels)
+    long['value'] = pd.to_numeric(long['value'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    fig = px.line(long, x=x_col, y='value', color=color_col, facet_col='metric', facet_col_wrap=3,
+                  category_orders={'metric': list(labels.values())},
+                  markers=True, title=title, facet_row_spacing=0.12)
+    fig.update_yaxes(matches=None, showticklabels=True, title_text=None)
+    fig.update_xaxes(title_text=None)
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split("=", 1)[-1]))
+    # percent ticks only on the panels that hold fractions: each panel's title
+    # annotation sits at the top of its plot area, which pins down its y-axis
+    pct_labels = {label for _, label, is_pct in metrics if is_pct}
+    pct_titles = [(a.x, a.y) for a in fig.layout.annotations if a.text in pct_labels]
+
+    def holds_fractions(ax):
+        x0, x1 = fig.layout['xaxis' + ax.anchor[1:]].domain
+        return any(x0 <= x <= x1 and abs(ax.domain[1] - y) < 1e-9 for x, y in pct_titles)
+
+    fig.update_yaxes(tickformat=".0%", selector=holds_fractions)
+    fig.update_layout(height=600, margin=dict(l=30, r=20, t=70, b=30))
+    return fig
+
+def plot_kpi_facets(df_plot, x_col, metrics, title, color_col=None):
     if df_plot.empty:
         st.write(f"No data for {title}")
         return
-    if color_col and color_col in df_plot.columns:
-        fig = px.line(df_plot, x=x_col, y=y_col, color=color_col, markers=True, title=title)
-    else:
-        fig = px.line(df_plot, x=x_col, y=y_col, markers=True, title=title)
-    if is_pct:
-        fig.update_yaxes(tickformat=".0%")
-    fig.update_layout(margin=dict(l=30, r=20, t=50, b=30))
+    if not (color_col and color_col in df_plot.columns):
+        color_col = None
+    fig = build_kpi_figure(df_plot, x_col, metrics, title, color_col)
     st.plotly_chart(fig, use_container_width=True)
 
+# per-member KPI means that the team view re-weights
+KPI_MEANS = ['QS_mean', 'Rev_mean', 'OnTime_pct', 'Eff_mean']
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def precompute_monthly(data_key, _df):
+    """
+    Monthly KPI aggregates per member over the whole sheet. Computed once per
+    workbook; the member selection only filters this small frame.
+    Keyed on the workbook hash alone (Streamlit skips hashing _df), so a rerun
+    costs a dict lookup rather than a pass over every row; the shared result
+    must be treated as read-only.
+    The _n_* columns count non-null values so the team view can re-weight the means.
+    """
+    # KPI means: output column -> source column
+    mean_cols = dict(zip(KPI_MEANS, [
+        'QS_frac' if 'QS_frac' in _df.columns else 'QS%',
+        'Rev_frac' if 'Rev_frac' in _df.columns else 'Revision/s',
+        'OnTime',
+        'Eff_frac' if 'Eff_frac' in _df.columns else 'Efficiency',
+    ]))
+    monthly = _df.groupby(['month','Name'], as_index=False, observed=True).agg(
+        **{k: (c, 'mean') for k, c in mean_cols.items()},
+        **{f'_n_{k}': (c, 'count') for k, c in mean_cols.items()},
+        Manhours = ('Actual Work Hours','sum'),
+        Tasks = ('month','size')
+    )
+    return monthly.sort_values(['month','Name'], ignore_index=True)
+
+def team_from_members(group_ind):
+    """
+    Team-level monthly aggregation rolled up from the per-member rows: sums add
+    up, means are weighted by each member's non-null count so they match the
+    row-level mean.
+    """
+    team_sums = group_ind.assign(
+        **{f'_w_{k}': group_ind[k] * group_ind[f'_n_{k}'] for k in KPI_MEANS}
+    ).groupby('month', as_index=False).sum(numeric_only=True)
+    return team_sums[['month']].assign(
+        **{k: team_sums[f'_w_{k}'] / team_sums[f'_n_{k}'] for k in KPI_MEANS},
+        Manhours = team_sums['Manhours'],
+        Tasks = team_sums['Tasks'],
+    )
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _to_csv_bytes(df):
+    # only re-encoded when the filtered frame actually changes; bounded like the
+    # other caches, since every member selection would otherwise stay in memory
+    return df.to_csv(index=False).encode('utf-8')
+
 # ---------- UI: Sidebar ----------
 st.sidebar.header("Data & Filters")
 uploaded = st.sidebar.file_uploader("Upload KPI Excel (.xlsx)", type=['xlsx','xls'])
@@ -174,19 +369,20 @@ st.sidebar.markdown("Select member(s) to compare (default = all).")
 # ---------- Load data ----------
 try:
     if uploaded is not None:
-        raw = load_excel_anysheet(uploaded)
+        raw_bytes = uploaded.getvalue()
     else:
-        raw = load_excel_anysheet("/mnt/data/KPI METRICS 2.xlsx")
+        with open("/mnt/data/KPI METRICS 2.xlsx", "rb") as fh:
+            raw_bytes = fh.read()
+    data_key = _workbook_key(raw_bytes)
+    df = clean_and_prepare_cached(data_key, raw_bytes)
 except Exception as e:
     st.error(f"Failed to load Excel file: {e}")
     st.stop()
 
-if raw is None or raw.empty:
+if df is None or df.empty:
     st.error("No data found. Upload a valid KPI Excel file.")
     st.stop()
 
-df = clean_and_prepare(raw)
-
 # ---------- Header summary ----------
 latest_dt = None
 if df['month_dt'].dropna().any():
@@ -196,12 +392,16 @@ else:
     st.subheader("Team KPI Dashboard")
 
 # ---------- Sidebar selects ----------
-members = sorted(df['Name'].dropna().unique().tolist()) if 'Name' in df.columns else []
+# Name is categorical (see clean_and_prepare): its categories are already the sorted distinct names
+members = df['Name'].cat.categories.tolist() if 'Name' in df.columns else []
 selected_members = st.sidebar.multiselect("Team member(s)", options=members, default=members)
 
 # apply member selection filter to individual charts (team charts still computed from full filtered set)
-flt = df.copy()
-if selected_members:
+# the default selection is every member — no need to scan the frame for it
+# (unless unnamed rows have to be dropped)
+partial_selection = bool(selected_members) and len(selected_members) < len(members)
+flt = df
+if partial_selection or (selected_members and df['Name'].hasnans):
     flt = flt[flt['Name'].isin(selected_members)]
 
 if flt.empty:
@@ -209,33 +409,17 @@ if flt.empty:
     st.stop()
 
 # ---------- Aggregations ----------
-# monthly per-member aggregation
-group_ind = flt.groupby(['month','Name'], as_index=False).agg(
-    QS_mean = ('QS_frac','mean') if 'QS_frac' in flt.columns else ('QS%','mean'),
-    Rev_mean = ('Rev_frac','mean') if 'Rev_frac' in flt.columns else ('Revision/s','mean'),
-    OnTime_pct = ('OnTime','mean'),
-    Eff_mean = ('Eff_frac','mean') if 'Eff_frac' in flt.columns else ('Efficiency','mean'),
-    Manhours = ('Actual Work Hours','sum'),
-    Tasks = ('_task_id','count')
-).sort_values('month')
-
-# team-level monthly aggregation (use full dataset, but filtered by selected members? 
-# as requested earlier: show team averaged across members in chosen selection; we will use flt)
-group_team = flt.groupby(['month'], as_index=False).agg(
-    QS_mean = ('QS_frac','mean') if 'QS_frac' in flt.columns else ('QS%','mean'),
-    Rev_mean = ('Rev_frac','mean') if 'Rev_frac' in flt.columns else ('Revision/s','mean'),
-    OnTime_pct = ('OnTime','mean'),
-    Eff_mean = ('Eff_frac','mean') if 'Eff_frac' in flt.columns else ('Efficiency','mean'),
-    Manhours = ('Actual Work Hours','sum'),
-    Tasks = ('_task_id','count')
-).sort_values('month')
+group_ind = precompute_monthly(data_key, df)
+if partial_selection:
+    group_ind = group_ind[group_ind['Name'].isin(selected_members)]
+group_team = team_from_members(group_ind)
 
 # ---------- Top KPI quick metrics ----------
 st.markdown("---")
 st.subheader("Quick team metrics (filtered selection)")
 col1, col2, col3, col4, col5 = st.columns(5)
-total_tasks = int(flt['_task_id'].count())
-completed_tasks = int(flt[flt['Status'].str.lower() == 'completed'].shape[0]) if 'Status' in flt.columns else "N/A"
+total_tasks = len(flt)
+completed_tasks = int(flt['_is_completed'].sum()) if '_is_completed' in flt.columns else "N/A"
 avg_eff_team = group_team['Eff_mean'].mean() if not group_team.empty else None
 avg_qs_team = group_team['QS_mean'].mean() if not group_team.empty else None
 total_manhours = int(flt['Actual Work Hours'].sum()) if 'Actual Work Hours' in flt.columns else 0
@@ -250,31 +434,23 @@ st.markdown("---")
 
 # ---------- Individual KPI line charts ----------
 st.header("Individual KPI Tracking — Full Timeline (per member)")
-plot_line_generic(group_ind, 'month', 'QS_mean', "Average Quality Score (per member)", color_col='Name', is_pct=True)
-plot_line_generic(group_ind, 'month', 'Rev_mean', "Average Revision Rate (per member)", color_col='Name', is_pct=True)
-plot_line_generic(group_ind, 'month', 'Tasks', "Total Completed Tasks (per member)", color_col='Name', is_pct=False)
-plot_line_generic(group_ind, 'month', 'OnTime_pct', "On-time Delivery (per member)", color_col='Name', is_pct=True)
-plot_line_generic(group_ind, 'month', 'Eff_mean', "Actual Work Efficiency (per member)", color_col='Name', is_pct=True)
-plot_line_generic(group_ind, 'month', 'Manhours', "Man-hours Spent (per member)", color_col='Name', is_pct=False)
+plot_kpi_facets(group_ind, 'month', KPI_CHARTS, "KPIs per member", color_col='Name')
 
 st.markdown("---")
 
 # ---------- Team KPI line charts ----------
 st.header("Team KPI Tracking — Full Timeline (averaged)")
-plot_line_generic(group_team, 'month', 'QS_mean', "Team Average Quality Score", is_pct=True)
-plot_line_generic(group_team, 'month', 'Rev_mean', "Team Average Revision Rate", is_pct=True)
-plot_line_generic(group_team, 'month', 'Tasks', "Team Total Completed Tasks", is_pct=False)
-plot_line_generic(group_team, 'month', 'OnTime_pct', "Team On-time Delivery", is_pct=True)
-plot_line_generic(group_team, 'month', 'Eff_mean', "Team Actual Work Efficiency", is_pct=True)
-plot_line_generic(group_team, 'month', 'Manhours', "Team Man-hours Spent", is_pct=False)
+plot_kpi_facets(group_team, 'month', KPI_CHARTS, "Team KPIs")
 
 st.markdown("---")
 
 # ---------- Leaderboards (always visible) ----------
 st.header("Leaderboards — Latest Month (filtered selection)")
+LEADERBOARD_TOP_K = 20
 if not group_ind.empty:
     latest_month = group_ind['month'].max()
-    latest_df = group_ind[group_ind['month'] == latest_month].copy()
+    # read-only below; the boolean mask already yields a new frame, so no extra copy
+    latest_df = group_ind[group_ind['month'] == latest_month]
     if latest_df.empty:
         st.write("No data available for latest month after filtering.")
     else:
@@ -286,25 +462,43 @@ if not group_ind.empty:
             "Man-hours Spent": ("Manhours", False)
         }
         cols = st.columns(len(lb_info))
+        names = latest_df['Name'].to_numpy()
         for i, (title, (colname, is_pct)) in enumerate(lb_info.items()):
-            df_lb = latest_df[['Name', colname]].sort_values(by=colname, ascending=False).reset_index(drop=True)
-            display = df_lb.copy()
+            # descending, missing last; large teams only sort the top K after a partial selection
+            vals = latest_df[colname].to_numpy(dtype='float64', na_value=np.nan)
+            order = np.arange(len(vals))
+            if len(vals) > LEADERBOARD_TOP_K:
+                order = np.sort(np.argpartition(-vals, LEADERBOARD_TOP_K - 1)[:LEADERBOARD_TOP_K])
+            order = order[np.argsort(-vals[order], kind='stable')]
+            vals = vals[order]
+            # format the whole column at once rather than a lambda per cell
             if is_pct:
-                display[colname] = display[colname].apply(lambda v: f"{v:.1%}" if pd.notna(v) else "N/A")
+                text = np.char.mod("%.1f%%", vals * 100)
             else:
-                display[colname] = display[colname].apply(lambda v: f"{int(v):,}" if pd.notna(v) else "N/A")
+                text = pd.Series(np.nan_to_num(vals).astype(np.int64)).map("{:,}".format).to_numpy()
+            display = pd.DataFrame({'Name': names[order], colname: np.where(np.isnan(vals), "N/A", text)})
             cols[i].subheader(title)
             cols[i].dataframe(display, use_container_width=True)
+            if len(latest_df) > LEADERBOARD_TOP_K:
+                cols[i].caption(f"Top {LEADERBOARD_TOP_K} of {len(latest_df)} members")
 else:
     st.write("Not enough data for leaderboards.")
 
 st.markdown("---")
 
 # ---------- Data inspector & download ----------
+# the expander body runs on every rerun, so only one page of rows is sent to the browser
+RAW_PAGE_ROWS = 1000
 with st.expander("Show filtered raw data (expand)"):
-    st.dataframe(flt.reset_index(drop=True))
-
-csv = flt.to_csv(index=False).encode('utf-8')
+    offset = 0
+    if len(flt) > RAW_PAGE_ROWS:
+        offset = int(st.number_input("First row", min_value=0, max_value=len(flt) - 1, value=0, step=RAW_PAGE_ROWS))
+    page = flt.iloc[offset:offset + RAW_PAGE_ROWS]
+    st.dataframe(page.reset_index(drop=True))
+    if len(flt) > RAW_PAGE_ROWS:
+        st.caption(f"Showing rows {offset + 1:,}–{offset + len(page):,} of {len(flt):,}. Download the CSV for the full table.")
+
+csv = _to_csv_bytes(flt)
 st.download_button("Download filtered CSV", data=csv, file_name="filtered_kpis.csv", mime="text/csv")
 
 st.markdown("Notes: This app attempts to automatically normalize percentage columns (e.g., `QS%`, `Revision/s`, `Efficiency`) whether they are entered as `0.92` or `92`. If a column looks wrong, tell me and I will add a manual toggle to force interpretation.")